@@ -56,7 +56,7 @@ Inputs
 - ``resources/opsd_load.csv`` Hourly per-country load profiles.
 - ``resources/regions_onshore.geojson``: confer :ref:`busregions`
 - ``resources/nuts3_shapes.geojson``: confer :ref:`shapes`
-- ``resources/powerplants.csv``: confer :ref:`powerplants`
+- ``resources/powerplants.parquet``: confer :ref:`powerplants`
 - ``resources/profile_{}.nc``: all technologies in ``config["renewables"].keys()``, confer :ref:`renewableprofiles`.
 - ``networks/base.nc``: confer :ref:`base`
 
@@ -193,7 +193,11 @@ def load_powerplants(ppl_fn=None):
         ppl_fn = snakemake.input.powerplants
     carrier_dict = {'ocgt': 'OCGT', 'ccgt': 'CCGT', 'bioenergy': 'biomass',
                     'ccgt, thermal': 'CCGT', 'hard coal': 'coal'}
-    return (pd.read_csv(ppl_fn, index_col=0, dtype={'bus': 'str'})
+    if ppl_fn.endswith('.parquet'):
+        ppl = pd.read_parquet(ppl_fn, engine='pyarrow')
+    else:
+        ppl = pd.read_csv(ppl_fn, index_col=0, dtype={'bus': 'str'})
+    return (ppl
             .powerplant.to_pypsa_names()
             .rename(columns=str.lower).drop(columns=['efficiency'])
             .replace({'carrier': carrier_dict}))
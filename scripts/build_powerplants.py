@@ -35,9 +35,13 @@ Outputs
 
     **Source:** `powerplantmatching on GitHub <https://github.com/FRESNA/powerplantmatching>`_
 
+- ``resource/powerplants.parquet``: the same list in Parquet format, which keeps the column types for downstream rules.
+
 Description
 -----------
 
+The powerplantmatching database is downloaded once and kept as ``resources/.cache/powerplantmatching-{version}.parquet``; reruns with the same powerplantmatching version within 30 days reuse this copy instead of downloading it again. Delete the file to force a fresh download.
+
 The configuration options ``electricity: powerplants_filter`` and ``electricity: custom_powerplants`` can be used to control whether data should be retrieved from the original powerplants database or from custom amendmends. These specify `pandas.query <https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.DataFrame.query.html>`_ commands.
 
 1. Adding all powerplants from custom:
@@ -72,6 +76,10 @@ The configuration options ``electricity: powerplants_filter`` and ``electricity:
 """
 
 import logging
+import os
+import tempfile
+import time
+from importlib.metadata import version
 from _helpers import configure_logging
 
 import pypsa
@@ -83,16 +91,126 @@ from scipy.spatial import cKDTree as KDTree
 
 logger = logging.getLogger(__name__)
 
+CUSTOM_POWERPLANTS_DTYPES = {
+    'bus': 'str', 'Fueltype': 'str', 'Technology': 'str', 'Set': 'str',
+    'Country': 'str', 'projectID': 'str', 'Capacity': 'float64',
+    'Efficiency': 'float64', 'Duration': 'float64', 'Volume_Mm3': 'float64',
+    'DamHeight_m': 'float64', 'YearCommissioned': 'float64',
+    'Retrofit': 'float64', 'YearDecommissioning': 'float64',
+    'lat': 'float64', 'lon': 'float64'}
+
+POWERPLANTS_CACHE_MAX_AGE = 30 * 24 * 3600 # seconds
+
+# separation between countries in the KDTree of map_country_bus, larger than
+# any distance between points on the unit sphere
+COUNTRY_OFFSET = 10.
+
+
+def stringify_project_ids(df):
+    """
+    Replace the ``projectID`` dictionaries of powerplantmatching by their
+    string representation, as written by ``to_csv``, such that the frame
+    can be stored as Parquet.
+    """
+    if 'projectID' not in df:
+        return df
+    ids = df.projectID
+    return df.assign(projectID=ids.where(ids.isnull(), ids.astype(str)))
+
+
+def load_powerplantmatching(cache_fn, max_age=POWERPLANTS_CACHE_MAX_AGE):
+    """
+    Retrieve the powerplantmatching database, reusing a local Parquet copy
+    at ``cache_fn`` if it is younger than ``max_age`` seconds.
+    """
+    if (os.path.isfile(cache_fn) and
+        time.time() - os.path.getmtime(cache_fn) < max_age):
+        logger.info(f"Reading cached powerplantmatching database from {cache_fn}")
+        return pd.read_parquet(cache_fn, engine='pyarrow')
+
+    ppl = stringify_project_ids(pm.powerplants(from_url=True))
+    cache_dir = os.path.dirname(cache_fn)
+    os.makedirs(cache_dir, exist_ok=True)
+    # write to a temporary file first, an interrupted write must not leave a
+    # truncated cache behind that passes the age check
+    with tempfile.NamedTemporaryFile(dir=cache_dir, suffix='.parquet',
+                                     delete=False) as f:
+        tmp_fn = f.name
+    try:
+        ppl.to_parquet(tmp_fn, engine='pyarrow', compression='zstd')
+        os.replace(tmp_fn, cache_fn)
+    except BaseException:
+        os.remove(tmp_fn)
+        raise
+    return ppl
+
+
+def fix_natural_gas(df):
+    """
+    Map steam turbines to OCGT and use the technology (defaulting to OCGT)
+    as fuel type of natural gas powerplants, in a single pass over both columns.
+    """
+    tech = df.Technology.to_numpy(dtype=object)
+    fuel = df.Fueltype.to_numpy(dtype=object)
+
+    tech = np.where(tech == 'Steam Turbine', 'OCGT', tech)
+    gas_tech = np.where(pd.isnull(tech), 'OCGT', tech)
+    fuel = np.where(fuel == 'Natural Gas', gas_tech, fuel)
+
+    return df.assign(Technology=tech, Fueltype=fuel)
+
 
 def add_custom_powerplants(ppl):
     custom_ppl_query = snakemake.config['electricity']['custom_powerplants']
     if not custom_ppl_query:
         return ppl
     add_ppls = pd.read_csv(snakemake.input.custom_powerplants, index_col=0,
-                           dtype={'bus': 'str'})
+                           dtype=CUSTOM_POWERPLANTS_DTYPES)
     if isinstance(custom_ppl_query, str):
         add_ppls.query(custom_ppl_query, inplace=True)
-    return ppl.append(add_ppls, sort=False, ignore_index=True, verify_integrity=True)
+    if add_ppls.empty:
+        return ppl
+    return ppl.append(add_ppls, sort=False, ignore_index=True)
+
+
+def lonlat_to_xyz(lon, lat):
+    """
+    Convert longitudes and latitudes in degrees to 3D unit vectors, whose
+    euclidean distances are monotonic in the great-circle distances.
+    """
+    lon, lat = np.deg2rad(lon), np.deg2rad(lat)
+    return np.column_stack([np.cos(lat) * np.cos(lon),
+                            np.cos(lat) * np.sin(lon),
+                            np.sin(lat)])
+
+
+def map_country_bus(ppl, substations):
+    """
+    Assign each powerplant to the closest substation within its own country.
+
+    Substations are placed on the unit sphere, so that the KDTree ranks them
+    by great-circle distance, and each country is shifted by
+    ``COUNTRY_OFFSET`` along an additional axis. Since the offset exceeds any
+    distance within a country, one batched query on a single tree only ever
+    returns substations from the powerplant's own country. Powerplants
+    without coordinates are not queried and remain without bus.
+    """
+    ppl = ppl.copy()
+    if 'bus' not in ppl:
+        ppl['bus'] = np.nan
+
+    countries = pd.Index(substations.country.unique())
+    substation_c = countries.get_indexer(substations.country)
+    ppl_c = countries.get_indexer(ppl.Country)
+    ppl_b = (ppl_c >= 0) & np.isfinite(ppl.lon.values) & np.isfinite(ppl.lat.values)
+
+    substation_xyz = lonlat_to_xyz(substations.x.values, substations.y.values)
+    kdtree = KDTree(np.column_stack([substation_xyz, COUNTRY_OFFSET * substation_c]))
+    coords = np.column_stack([lonlat_to_xyz(ppl.lon.values, ppl.lat.values),
+                              COUNTRY_OFFSET * ppl_c])[ppl_b]
+    tree_i = kdtree.query(coords, distance_upper_bound=COUNTRY_OFFSET / 2)[1]
+    ppl.loc[ppl_b, 'bus'] = substations.index.append(pd.Index([np.nan]))[tree_i]
+    return ppl
 
 
 if __name__ == "__main__":
@@ -104,16 +222,14 @@ if __name__ == "__main__":
     n = pypsa.Network(snakemake.input.base_network)
     countries = n.buses.country.unique()
 
-    ppl = (pm.powerplants(from_url=True)
+    ppm_version = version('powerplantmatching')
+    cache_fn = os.path.join(os.path.dirname(snakemake.output[0]), '.cache',
+                            f'powerplantmatching-{ppm_version}.parquet')
+    ppl = (load_powerplantmatching(cache_fn)
            .powerplant.fill_missing_decommyears()
            .powerplant.convert_country_to_alpha2()
-           .query('Fueltype not in ["Solar", "Wind"] and Country in @countries')
-           .replace({'Technology': {'Steam Turbine': 'OCGT'}})
-            .assign(Fueltype=lambda df: (
-                    df.Fueltype
-                      .where(df.Fueltype != 'Natural Gas',
-                             df.Technology.replace('Steam Turbine',
-                                                   'OCGT').fillna('OCGT')))))
+           .loc[lambda df: ~df.Fueltype.isin(['Solar', 'Wind']) & df.Country.isin(countries)]
+           .pipe(fix_natural_gas))
 
     ppl_query = snakemake.config['electricity']['powerplants_filter']
     if isinstance(ppl_query, str):
@@ -121,15 +237,11 @@ if __name__ == "__main__":
 
     ppl = add_custom_powerplants(ppl) # add carriers from own powerplant files
 
-    cntries_without_ppl = [c for c in countries if c not in ppl.Country.unique()]
-
-    for c in countries:
-        substation_i = n.buses.query('substation_lv and country == @c').index
-        kdtree = KDTree(n.buses.loc[substation_i, ['x','y']].values)
-        ppl_i = ppl.query('Country == @c').index
+    ppl_countries = frozenset(ppl.Country.unique())
+    cntries_without_ppl = [c for c in countries if c not in ppl_countries]
 
-        tree_i = kdtree.query(ppl.loc[ppl_i, ['lon','lat']].values)[1]
-        ppl.loc[ppl_i, 'bus'] = substation_i.append(pd.Index([np.nan]))[tree_i]
+    substations = n.buses[n.buses.substation_lv]
+    ppl = map_country_bus(ppl, substations)
 
     if cntries_without_ppl:
         logging.warning(f"No powerplants known in: {', '.join(cntries_without_ppl)}")
@@ -139,3 +251,4 @@ if __name__ == "__main__":
         logging.warning(f"Couldn't find close bus for {bus_null_b.sum()} powerplants")
 
     ppl.to_csv(snakemake.output[0])
+    ppl.to_parquet(snakemake.output[1], engine='pyarrow', compression='zstd')